@@ -6,12 +6,16 @@ from openpyxl import Workbook
 from openpyxl.styles import Font
 from openpyxl.utils import get_column_letter
 import io
+from profiling import init_profiling
 
 app = Flask(__name__)
 app.secret_key = 'dev-secret-key-change-in-production'
 
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'monthlyReport.db')
 
+# Opt-in per-request profiling, see profiling.py
+init_profiling(app)
+
 def get_db_connection():
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
@@ -0,0 +1,299 @@
+"""
+Opt-in cProfile capture of single requests.
+
+Profiling is off unless one of these is set (config key or environment variable):
+
+    PROFILING_ENABLED=1        Admin page at /admin/profiles is available, and any
+                               request sent with the header "X-Profile-Request: 1"
+                               is profiled. The admin page can also arm a capture
+                               of the next request made from the same browser.
+    PROFILING_ADMIN_TOKEN=...  A request sent with "X-Profile-Request: <token>"
+                               is profiled even when PROFILING_ENABLED is off.
+
+Each capture is saved to PROFILING_DIR as a .prof file (loadable with pstats or
+snakeviz) plus a .json summary with SQL, Jinja and openpyxl time and the top
+hotspots. Captures older than PROFILING_RETENTION_HOURS are deleted, and at most
+PROFILING_MAX_FILES are kept.
+
+Before Python 3.12 cProfile records only the thread that enabled it. From 3.12 it
+is built on sys.monitoring and records every thread, so a request served at the
+same time as the captured one (app.run serves requests on threads) would be mixed
+into its profile. On 3.12+ such a capture is discarded and listed with the reason;
+retry it, or run with app.run(threaded=False) to profile under load.
+"""
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+from flask import Blueprint, current_app, g, request, session, render_template, redirect, url_for, flash, send_from_directory, abort
+
+PROFILE_HEADER = 'X-Profile-Request'
+TOP_N = 15
+
+OVERLAP_MESSAGE = ('Another request ran during this capture. On Python 3.12+ cProfile records every '
+                   'thread, so the data was discarded. Retry the request, or run the app with threaded=False.')
+
+# Slow requests usually depend on the saved filters, so record them with the capture
+FILTER_SESSION_KEYS = {
+    'scans': 'scan_filters',
+    'export_scans': 'scan_filters',
+    'artifacts': 'artifact_filters',
+    'export_artifacts': 'artifact_filters',
+}
+
+bp = Blueprint('profiling', __name__)
+
+# Only one request is captured at a time; from 3.12 a second profiler cannot even start
+_capture_lock = threading.Lock()
+
+# From 3.12 cProfile also records calls made by other threads
+PROFILER_SEES_ALL_THREADS = sys.version_info >= (3, 12)
+
+# Requests in flight, used to tell whether another request overlapped a capture
+_requests_lock = threading.Lock()
+_active_requests = 0
+_capture_running = False
+_capture_overlapped = False
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), 'templates')
+
+
+def _in_sql(key):
+    filename, _, name = key
+    return 'sqlite3' in name or os.sep + 'sqlite3' + os.sep in filename
+
+
+def _in_jinja(key):
+    filename, _, name = key
+    return (os.sep + 'jinja2' + os.sep in filename
+            or filename.endswith(os.path.join('flask', 'templating.py'))
+            or filename.startswith(TEMPLATES_DIR))
+
+
+def _in_openpyxl(key):
+    filename, _, name = key
+    return os.sep + 'openpyxl' + os.sep in filename or os.sep + 'et_xmlfile' + os.sep in filename
+
+
+CATEGORIES = [
+    ('SQL', _in_sql),
+    ('Jinja', _in_jinja),
+    ('openpyxl', _in_openpyxl),
+]
+
+
+def init_profiling(app):
+    app.config.setdefault('PROFILING_ENABLED', os.environ.get('PROFILING_ENABLED', '') in ('1', 'true', 'yes'))
+    app.config.setdefault('PROFILING_ADMIN_TOKEN', os.environ.get('PROFILING_ADMIN_TOKEN', ''))
+    app.config.setdefault('PROFILING_DIR', os.environ.get('PROFILING_DIR', os.path.join(os.path.dirname(__file__), 'profiles')))
+    app.config.setdefault('PROFILING_RETENTION_HOURS', float(os.environ.get('PROFILING_RETENTION_HOURS', 24)))
+    app.config.setdefault('PROFILING_MAX_FILES', int(os.environ.get('PROFILING_MAX_FILES', 50)))
+
+    app.before_request(_start_profile)
+    app.teardown_request(_finish_profile)
+    app.register_blueprint(bp)
+
+
+def _admin_allowed():
+    if current_app.config['PROFILING_ENABLED']:
+        return True
+    token = current_app.config['PROFILING_ADMIN_TOKEN']
+    return bool(token) and request.headers.get(PROFILE_HEADER) == token
+
+
+def _wants_profile():
+    if request.endpoint is None or request.endpoint == 'static' or request.blueprint == bp.name:
+        return False
+    header = request.headers.get(PROFILE_HEADER)
+    token = current_app.config['PROFILING_ADMIN_TOKEN']
+    if token and header == token:
+        return True
+    if not current_app.config['PROFILING_ENABLED']:
+        return False
+    if header == '1':
+        return True
+    return session.get('profile_next', False)
+
+
+def _start_profile():
+    global _active_requests, _capture_running, _capture_overlapped
+    with _requests_lock:
+        _active_requests += 1
+        if _capture_running:
+            _capture_overlapped = True
+    g.profile_counted = True
+
+    if not _wants_profile():
+        return
+    if not _capture_lock.acquire(blocking=False):
+        # An armed capture stays armed for the next request
+        current_app.logger.info('Profile capture already in progress, skipping %s', request.path)
+        return
+    session.pop('profile_next', None)
+    with _requests_lock:
+        _capture_running = True
+        # Requests already in flight would be recorded alongside this one
+        _capture_overlapped = _active_requests > 1
+    g.profiler = cProfile.Profile()
+    g.profile_started = time.perf_counter()
+    g.profiler.enable()
+
+
+def _finish_profile(exc):
+    global _active_requests, _capture_running
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        try:
+            profiler.disable()
+            elapsed = time.perf_counter() - g.pop('profile_started')
+            with _requests_lock:
+                _capture_running = False
+                overlapped = _capture_overlapped
+            if overlapped and PROFILER_SEES_ALL_THREADS:
+                current_app.logger.warning('Discarding profile of %s: another request ran during the capture', request.path)
+                _save_profile(None, elapsed, exc, discarded=OVERLAP_MESSAGE)
+            else:
+                _save_profile(profiler, elapsed, exc)
+        except Exception as e:
+            current_app.logger.error('Failed to save profile: %s', e)
+        finally:
+            _capture_lock.release()
+
+    if g.pop('profile_counted', False):
+        with _requests_lock:
+            _active_requests -= 1
+
+
+def _category_times(stats):
+    # Sum cumulative time on calls that cross into each category from outside it,
+    # so time spent inside (e.g. openpyxl calling openpyxl) is not counted twice.
+    # Builtin callers are skipped: Jinja resumes its template generators through
+    # str.join, which would count the same rendering again.
+    totals = {}
+    for label, matches in CATEGORIES:
+        total = 0.0
+        for key, (cc, nc, tt, ct, callers) in stats.stats.items():
+            if not matches(key):
+                continue
+            for caller, caller_stats in callers.items():
+                if caller[0] != '~' and not matches(caller):
+                    total += caller_stats[3]
+        totals[label] = total
+    return totals
+
+
+def _format_function(key):
+    filename, line, name = key
+    if filename == '~':
+        return name
+    return f'{os.path.basename(filename)}:{line}({name})'
+
+
+def _hotspots(stats):
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:TOP_N]
+    return [{
+        'function': _format_function(key),
+        'calls': nc,
+        'tottime': tt,
+        'cumtime': ct,
+    } for key, (cc, nc, tt, ct, callers) in rows]
+
+
+def _save_profile(profiler, elapsed, exc, discarded=None):
+    profile_dir = current_app.config['PROFILING_DIR']
+    os.makedirs(profile_dir, exist_ok=True)
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    endpoint = re.sub(r'[^A-Za-z0-9_]', '_', request.endpoint or 'unknown')
+    name = f'{timestamp}_{endpoint}'
+
+    summary = {
+        'name': name,
+        'captured': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'filters': session.get(FILTER_SESSION_KEYS.get(request.endpoint, '')),
+        'error': str(exc) if exc else None,
+        'elapsed': elapsed,
+        'discarded': discarded,
+    }
+    # A discarded capture keeps only its summary, so the admin page can say why
+    if discarded is None:
+        stats = pstats.Stats(profiler)
+        stats.dump_stats(os.path.join(profile_dir, name + '.prof'))
+        summary.update({
+            'profiled': stats.total_tt,
+            'categories': _category_times(stats),
+            'hotspots': _hotspots(stats),
+        })
+    with open(os.path.join(profile_dir, name + '.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+
+    _prune_profiles(profile_dir)
+
+
+def _prune_profiles(profile_dir):
+    cutoff = time.time() - current_app.config['PROFILING_RETENTION_HOURS'] * 3600
+    names = sorted({os.path.splitext(f)[0] for f in os.listdir(profile_dir) if f.endswith(('.prof', '.json'))}, reverse=True)
+    for index, name in enumerate(names):
+        summary_path = os.path.join(profile_dir, name + '.json')
+        expired = not os.path.exists(summary_path) or os.path.getmtime(summary_path) < cutoff
+        if expired or index >= current_app.config['PROFILING_MAX_FILES']:
+            for ext in ('.prof', '.json'):
+                path = os.path.join(profile_dir, name + ext)
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def _load_summaries(profile_dir):
+    summaries = []
+    if not os.path.isdir(profile_dir):
+        return summaries
+    for filename in sorted(os.listdir(profile_dir), reverse=True):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(profile_dir, filename), encoding='utf-8') as f:
+                summaries.append(json.load(f))
+        except (OSError, ValueError) as e:
+            current_app.logger.warning('Skipping unreadable profile %s: %s', filename, e)
+    return summaries
+
+
+@bp.route('/admin/profiles')
+def profiles():
+    if not _admin_allowed():
+        abort(404)
+    profile_dir = current_app.config['PROFILING_DIR']
+    # Skip pruning while a capture is being written so its files are not removed half-saved
+    if os.path.isdir(profile_dir) and _capture_lock.acquire(blocking=False):
+        try:
+            _prune_profiles(profile_dir)
+        finally:
+            _capture_lock.release()
+    return render_template('profiles.html', profiles=_load_summaries(profile_dir),
+                           armed=session.get('profile_next', False),
+                           retention_hours=current_app.config['PROFILING_RETENTION_HOURS'])
+
+
+@bp.route('/admin/profiles/arm', methods=['POST'])
+def arm_profile():
+    if not current_app.config['PROFILING_ENABLED']:
+        abort(404)
+    session['profile_next'] = True
+    flash('The next request from this browser will be profiled.', 'success')
+    return redirect(url_for('profiling.profiles'))
+
+
+@bp.route('/admin/profiles/<name>.prof')
+def download_profile(name):
+    if not _admin_allowed():
+        abort(404)
+    return send_from_directory(current_app.config['PROFILING_DIR'], name + '.prof', as_attachment=True)
@@ -0,0 +1,418 @@
+"""
+Streaming parser for Mend getProjectAlerts responses.
+
+MendPopulateTables.ps1 loads the whole getProjectAlerts body with ConvertFrom-Json
+(and re-serializes it at depth 10 in verbose mode) just to read
+alerts.vulnerability.cvss3_severity. For large projects that body is several
+megabytes. This script reads the body incrementally, decodes one alert at a time
+and tallies severities, so memory stays bounded by the size of a single alert.
+
+Save the response with Invoke-WebRequest -OutFile, then:
+
+    python MendParseAlerts.py alerts1.json alerts2.json ...
+    python MendParseAlerts.py --findings-dir findings alerts*.json
+    python MendParseAlerts.py - < alerts.json
+    python MendParseAlerts.py --benchmark 200000
+
+Output is CSV (File, Critical, High, Medium, Alerts) on stdout. As in the
+PowerShell script, a project with no vulnerabilities reports -1 for each count.
+Several files are parsed in a process pool.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+CHUNK_SIZE = 64 * 1024
+SEVERITIES = ('critical', 'high', 'medium')
+
+_STRUCTURAL = re.compile(r'[{}\[\]"]')
+_STRING_END = re.compile(r'["\\]')
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_DELIMITER = re.compile(r'[ \t\n\r]*,')
+# Longest token prefix that can fail to decode only because input stopped (\uXXX)
+_PARTIAL_TOKEN = 6
+
+
+def _find_alerts_array(stream, chunk_size):
+    """Read up to the '[' that opens the top-level "alerts" array.
+
+    Returns the unread remainder of the current chunk and its character offset
+    in the stream, or (None, offset) if there is no such array.
+    """
+    offset = 0
+    depth = 0
+    in_string = False
+    escape = False
+    key_parts = []      # pieces of the current string at depth 1 (object keys)
+    last_key = None
+
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return None, offset
+        n = len(chunk)
+        pos = 0
+
+        while pos < n:
+            if in_string:
+                if escape:
+                    if depth == 1:
+                        key_parts.append(chunk[pos])
+                    escape = False
+                    pos += 1
+                    continue
+                m = _STRING_END.search(chunk, pos)
+                if m is None:
+                    if depth == 1:
+                        key_parts.append(chunk[pos:])
+                    break
+                i = m.start()
+                if chunk[i] == '\\':
+                    # Keep the escape sequence raw; only "alerts" has to match
+                    if depth == 1:
+                        key_parts.append(chunk[pos:i + 2])
+                    if i + 1 >= n:
+                        escape = True
+                    pos = i + 2
+                    continue
+                if depth == 1:
+                    key_parts.append(chunk[pos:i])
+                    last_key = ''.join(key_parts)
+                    key_parts = []
+                in_string = False
+                pos = i + 1
+                continue
+
+            m = _STRUCTURAL.search(chunk, pos)
+            if m is None:
+                break
+            i = m.start()
+            c = chunk[i]
+            pos = i + 1
+
+            if c == '"':
+                in_string = True
+            elif c == '{' or c == '[':
+                if depth == 1 and c == '[' and last_key == 'alerts':
+                    return chunk[pos:], offset + pos
+                depth += 1
+            else:
+                depth -= 1
+
+        offset += n
+
+
+def _needs_more_input(err, buf):
+    # An alert cut off by the end of the buffer fails inside an unterminated string
+    # or within the last few characters (a partial literal, number or \u escape).
+    # Anything earlier is a real syntax error.
+    return err.msg.startswith('Unterminated string') or err.pos >= len(buf) - _PARTIAL_TOKEN
+
+
+def iter_alerts(stream, chunk_size=CHUNK_SIZE):
+    """Yield each object in the top-level "alerts" array of a text stream.
+
+    Only the alert being decoded (plus one chunk) is held in memory. Invalid
+    JSON raises ValueError with the character offset in the stream.
+    """
+    buf, base = _find_alerts_array(stream, chunk_size)
+    if buf is None:
+        return
+    decoder = json.JSONDecoder()
+    pos = 0
+    eof = False
+    first = True            # no alert read yet, so ']' may close an empty array
+    after_alert = False     # an alert was just read, so ',' or ']' must follow
+
+    while True:
+        m = _WHITESPACE.match(buf, pos)
+        pos = m.end()
+        if pos == len(buf):
+            if eof:
+                raise ValueError(f'Truncated JSON document at character {base + pos}')
+            base += len(buf)
+            buf = stream.read(chunk_size)
+            pos = 0
+            eof = not buf
+            continue
+        c = buf[pos]
+        if after_alert:
+            if c == ']':
+                return
+            if c != ',':
+                raise ValueError(f"Expecting ',' delimiter at character {base + pos}")
+            after_alert = False
+            pos += 1
+            continue
+        if c == ']' and first:
+            return
+        try:
+            alert, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as err:
+            if eof or not _needs_more_input(err, buf):
+                # Some decoder messages already end in "at" ("Unterminated string starting at")
+                raise ValueError(f'{err.msg.removesuffix(" at")} at character {base + err.pos}') from None
+            incomplete = True
+        else:
+            # A number near the buffer end may continue in the next chunk ("6.5|e10");
+            # objects, arrays, strings and literals are complete once decoded
+            incomplete = (not eof and isinstance(alert, (int, float))
+                          and end >= len(buf) - _PARTIAL_TOKEN)
+        if incomplete:
+            # Alert spans the chunk boundary. Read at least as much again as is
+            # buffered so an alert larger than a chunk is not re-copied many times.
+            more = stream.read(max(chunk_size, len(buf) - pos))
+            eof = not more
+            base += pos
+            buf = buf[pos:] + more
+            pos = 0
+            continue
+        first = False
+        # Fast path for the usual "alert, alert" layout; anything else is checked above
+        m = _DELIMITER.match(buf, end)
+        if m:
+            pos = m.end()
+        else:
+            pos = end
+            after_alert = True
+        if isinstance(alert, dict):
+            yield alert
+
+
+def alert_severity(alert):
+    vulnerability = alert.get('vulnerability') or {}
+    severity = vulnerability.get('cvss3_severity')
+    return severity.lower() if isinstance(severity, str) else None
+
+
+def alert_finding(alert):
+    vulnerability = alert.get('vulnerability') or {}
+    library = alert.get('library') or {}
+    return {
+        'project': alert.get('project'),
+        'library': library.get('filename') or library.get('name'),
+        'vulnerability': vulnerability.get('name'),
+        'severity': alert_severity(alert),
+        'score': vulnerability.get('cvss3_score'),
+    }
+
+
+def tally_alerts(stream, findings_out=None):
+    """Count critical/high/medium alerts, optionally writing findings as JSON lines."""
+    counts = dict.fromkeys(SEVERITIES, 0)
+    scored = 0
+    total = 0
+    for alert in iter_alerts(stream):
+        total += 1
+        severity = alert_severity(alert)
+        if severity is None:
+            continue
+        scored += 1
+        if severity in counts:
+            counts[severity] += 1
+        if findings_out is not None:
+            findings_out.write(json.dumps(alert_finding(alert)) + '\n')
+
+    # Match MendPopulateTables.ps1: no vulnerabilities at all is reported as -1
+    if scored == 0:
+        counts = dict.fromkeys(SEVERITIES, -1)
+    counts['alerts'] = total
+    return counts
+
+
+def parse_stream(stream, name, findings_out=None):
+    """Tally one response, naming it in any parse error."""
+    try:
+        counts = tally_alerts(stream, findings_out)
+    except ValueError as e:
+        raise ValueError(f'{name}: {e}') from e
+    counts['file'] = name
+    return counts
+
+
+def findings_name(path):
+    """Findings file for an input: its file name (extension kept) plus .findings.jsonl.
+
+    stdin ("-") gets -.findings.jsonl, which no input file name can produce.
+    """
+    return os.path.basename(path) + '.findings.jsonl'
+
+
+def _parse_with_findings(stream, name, findings_dir):
+    if not findings_dir:
+        return parse_stream(stream, name)
+    # Write to a temporary file and rename it only once the whole input parsed,
+    # so a failed input never leaves empty or partial findings behind
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=findings_dir)
+    try:
+        with open(fd, 'w', encoding='utf-8') as findings_out:
+            counts = parse_stream(stream, name, findings_out)
+        os.replace(tmp_path, os.path.join(findings_dir, findings_name(name)))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return counts
+
+
+def parse_file(path, findings_dir=None):
+    # utf-8-sig tolerates the BOM that some PowerShell writers add
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        return _parse_with_findings(f, path, findings_dir)
+
+
+def parse_stdin(findings_dir=None):
+    stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig')
+    return _parse_with_findings(stream, '-', findings_dir)
+
+
+def _result(path, parse):
+    try:
+        return path, parse(), None
+    except (OSError, ValueError) as e:
+        return path, None, e
+
+
+def parse_files(paths, findings_dir=None, workers=None):
+    """Parse each file, returning (path, counts, error) tuples in input order.
+
+    A file that cannot be read or parsed gets an error instead of counts, so one
+    bad response does not lose the results for the others.
+    """
+    if len(paths) == 1 or workers == 1:
+        return [_result(path, lambda: parse_file(path, findings_dir)) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(parse_file, path, findings_dir) for path in paths]
+        return [_result(path, future.result) for path, future in zip(paths, futures)]
+
+
+def write_synthetic_payload(path, alert_count):
+    severities = ('critical', 'high', 'medium', 'low')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"alerts": [')
+        for i in range(alert_count):
+            if i:
+                f.write(',')
+            json.dump({
+                'name': 'Security Vulnerability',
+                'type': 'SECURITY_VULNERABILITY',
+                'level': 'MAJOR',
+                'library': {
+                    'keyUuid': f'uuid-{i}',
+                    'filename': f'library-{i % 500}.jar',
+                    'description': 'Synthetic library "with" escaped \\ text',
+                },
+                'project': 'SyntheticProject',
+                'vulnerability': {
+                    'name': f'CVE-2024-{i:05d}',
+                    'cvss3_severity': severities[i % len(severities)],
+                    'cvss3_score': 5.0 + (i % 50) / 10,
+                    'description': 'x' * 200,
+                },
+            }, f)
+        f.write('], "requestToken": "synthetic"}')
+
+
+def _measure(func):
+    # Time and peak memory come from separate runs; tracemalloc slows allocation
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def _full_document_counts(path):
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        content = json.load(f)
+    counts = dict.fromkeys(SEVERITIES, 0)
+    for alert in content.get('alerts') or []:
+        severity = alert_severity(alert)
+        if severity in counts:
+            counts[severity] += 1
+    return counts
+
+
+def benchmark(alert_count):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'alerts.json')
+        write_synthetic_payload(path, alert_count)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+
+        full, full_time, full_peak = _measure(lambda: _full_document_counts(path))
+        streamed, stream_time, stream_peak = _measure(lambda: parse_file(path))
+
+    for severity in SEVERITIES:
+        if full[severity] != streamed[severity]:
+            raise RuntimeError(f'Count mismatch for {severity}: {full[severity]} vs {streamed[severity]}')
+
+    print(f'Payload: {alert_count} alerts, {size_mb:.1f} MB')
+    print(f'Full document: {full_time:.2f}s, peak {full_peak / (1024 * 1024):.1f} MB')
+    print(f'Streaming:     {stream_time:.2f}s, peak {stream_peak / (1024 * 1024):.1f} MB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tally Mend getProjectAlerts severities without loading the whole response.')
+    parser.add_argument('files', nargs='*', help='Saved getProjectAlerts responses ("-" alone reads stdin)')
+    parser.add_argument('--findings-dir', help='Write one <name>.findings.jsonl per input file here (-.findings.jsonl for stdin)')
+    parser.add_argument('--workers', type=int, help='Process pool size (default: CPU count)')
+    parser.add_argument('--benchmark', type=int, metavar='ALERTS',
+                        help='Compare streaming against full-document parsing on a synthetic payload')
+    args = parser.parse_args()
+
+    if args.benchmark is not None:
+        if args.benchmark < 1:
+            parser.error('--benchmark must be at least 1')
+        benchmark(args.benchmark)
+        return
+
+    if not args.files:
+        parser.error('no input files')
+    if '-' in args.files and len(args.files) > 1:
+        parser.error('"-" (stdin) cannot be combined with other input files')
+    if args.workers is not None and args.workers < 1:
+        parser.error('--workers must be at least 1')
+
+    if args.findings_dir:
+        # Inputs with the same file name in different folders would overwrite each
+        # other's findings; compare case-insensitively as Windows does
+        seen = {}
+        for path in args.files:
+            name = findings_name(path).lower()
+            if name in seen:
+                parser.error(f'{seen[name]} and {path} would both write {findings_name(path)}; rename one or use separate runs')
+            seen[name] = path
+        os.makedirs(args.findings_dir, exist_ok=True)
+
+    writer = csv.writer(sys.stdout, lineterminator='\n')
+    writer.writerow(['File', 'Critical', 'High', 'Medium', 'Alerts'])
+
+    if args.files == ['-']:
+        results = [_result('-', lambda: parse_stdin(args.findings_dir))]
+    else:
+        results = parse_files(args.files, args.findings_dir, args.workers)
+
+    failed = 0
+    for path, counts, error in results:
+        if error is not None:
+            print(error, file=sys.stderr)
+            failed += 1
+            continue
+        writer.writerow([path, counts['critical'], counts['high'], counts['medium'], counts['alerts']])
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()